@@ -1,50 +1,149 @@
+import asyncio
+import atexit
+import hashlib
+import io
+import mimetypes
 import os
-import requests
+import shutil
 import tempfile
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import httpx
 from mcp.server.fastmcp import FastMCP
 from mcp.server.fastmcp.prompts import base
 from markitdown import MarkItDown
 
 mcp = FastMCP(name="DocumentReader", 
               instructions="This server provides tools to read PDF and DOCX documents into markdown",
-                dependencies=["markitdown[all]","requests","os","tempfile"],
+                dependencies=["markitdown[all]","httpx[http2]","os","tempfile"],
                 description="This server provides tools to read PDF and DOCX documents into markdown",)
 
 md = MarkItDown()
 
+# Tiny sample documents used to warm up the conversion backends
+_MIN_PDF_BYTES = (
+    b"%PDF-1.4\n"
+    b"1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 72 72]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n"
+    b"%%EOF\n"
+)
+
+def _min_docx_bytes() -> bytes:
+    """Build a minimal single-paragraph DOCX in memory."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as docx:
+        docx.writestr("[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>')
+        docx.writestr("_rels/.rels",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+            '</Relationships>')
+        docx.writestr("word/document.xml",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            '<w:body><w:p><w:r><w:t>warm-up</w:t></w:r></w:p></w:body>'
+            '</w:document>')
+    return buf.getvalue()
+
+def _warm_up() -> None:
+    """
+    Pay MarkItDown's cold-start cost up front. The PDF and DOCX backends are
+    imported lazily on first use, so each pool worker converts a tiny sample
+    of both formats when it starts. Failures are ignored; they only mean the
+    first real request is slower.
+    """
+    try:
+        import pdfminer.high_level  # noqa: F401
+        import mammoth  # noqa: F401
+    except ImportError:
+        pass
+    for data, ext in ((_MIN_PDF_BYTES, ".pdf"), (_min_docx_bytes(), ".docx")):
+        try:
+            md.convert_stream(io.BytesIO(data), file_extension=ext)
+        except Exception:
+            pass
+
+# MarkItDown's parsing is mostly pure-Python CPU work, so conversions run in
+# worker processes to avoid serializing on the GIL. Workers start on demand
+# and warm up their conversion backends first.
+def _new_pool() -> ProcessPoolExecutor:
+    """Create the conversion pool; workers warm up their backends on start."""
+    return ProcessPoolExecutor(max_workers=min(8, os.cpu_count() or 1), initializer=_warm_up)
+
+_POOL = _new_pool()
+
+# Converted markdown keyed on document identity (content hash for downloads,
+# path + mtime + size for local files), evicted least recently used first.
+CACHE_SIZE = int(os.environ.get("DOC_CACHE_SIZE", "128"))
+_cache: OrderedDict[tuple, str] = OrderedDict()
+
+# Downloads are checked against these before and while the body is fetched
+ALLOWED_CONTENT_TYPES = {
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/octet-stream",
+}
+MAX_DOWNLOAD_MB = int(os.environ.get("DOC_MAX_MB", "100"))
+
+# Maximum number of documents read_documents converts at the same time
+DOC_CONCURRENCY = int(os.environ.get("DOC_CONCURRENCY", "8"))
+
 @mcp.tool(name="Read PDF Document", description="Read a PDF file and return the text content in LLM friendly MarkDown format.")
-def read_pdf(file_path: str) -> str:
+async def read_pdf(file_path: str) -> str:
     """Read a PDF file and return the text content in LLM friendly MarkDown format.
     
     Args:
         file_path: Path or public URI to the PDF file to read
     """
     try:
-        local_path = get_local_file(file_path)
-        doc = md.convert(local_path)
-        content: str = ""
-        if doc.text_content is not None:
-            content = doc.text_content
-        return content
+        return await convert_to_markdown(file_path)
     except Exception as e:
         return f"Error reading PDF: {str(e)}"
     
 @mcp.tool(name="Read DOCX Document", description="Read a DOCX file and return the text content in LLM friendly MarkDown format.")   
-def read_docx(file_path: str) -> str:
+async def read_docx(file_path: str) -> str:
     """Read a DOCX file and return the text content in LLM friendly MarkDown format.
     
     Args:
         file_path: Path or public URI to the Word document to read
     """
     try:
-        local_path = get_local_file(file_path)
-        doc = md.convert(local_path)
-        content: str = ""
-        if doc.text_content is not None:
-            content = doc.text_content
-        return content
+        return await convert_to_markdown(file_path)
     except Exception as e:
         return f"Error reading DOCX: {str(e)}"
+
+@mcp.tool(name="Read Documents", description="Read several PDF or DOCX files concurrently and return each one's text content in LLM friendly MarkDown format.")
+async def read_documents(file_paths: list[str]) -> list[dict]:
+    """Read several PDF or DOCX files concurrently and return their MarkDown content.
+    
+    Args:
+        file_paths: Paths or public URIs to the documents to read
+    
+    Returns one entry per input path, in order, holding either the
+    "markdown" content or the "error" encountered for that document.
+    """
+    sem = asyncio.Semaphore(DOC_CONCURRENCY)
+
+    async def read_one(file_path: str) -> dict:
+        async with sem:
+            return {"path": file_path, "markdown": await convert_to_markdown(file_path)}
+
+    results = await asyncio.gather(*(read_one(p) for p in file_paths), return_exceptions=True)
+    return [
+        {"path": p, "error": str(r)} if isinstance(r, Exception) else r
+        for p, r in zip(file_paths, results)
+    ]
     
 ##Prompts
 @mcp.prompt(name="Debug PDF", description="Helps to debug errors for PDF issues.")
@@ -63,30 +162,195 @@ def debug_pdf_path(error: str) -> list[base.Message]:
 
 
 ##Helpers
-def get_local_file(file_path: str) -> str:
+def is_remote(file_path: str) -> bool:
+    """Return True if file_path is a public http(s) URI."""
+    return file_path.startswith("http://") or file_path.startswith("https://")
+
+_tmpdir: str | None = None
+
+def get_tmpdir() -> str:
+    """
+    Return the directory holding downloaded documents, creating it on first
+    use. It is created lazily so pool workers importing this module do not
+    each make one, and it is removed when the server exits.
+    """
+    global _tmpdir
+    if _tmpdir is None:
+        _tmpdir = tempfile.mkdtemp(prefix="mcp-doc-")
+        atexit.register(shutil.rmtree, _tmpdir, ignore_errors=True)
+    return _tmpdir
+
+def is_temp_file(local_path: str) -> bool:
+    """Return True if local_path is a download inside the temporary directory."""
+    return _tmpdir is not None and local_path.startswith(_tmpdir + os.sep)
+
+async def convert_to_markdown(file_path: str) -> str:
+    """
+    Fetch the document if needed and convert it to markdown. MarkItDown parsing
+    runs in the process pool, keeping the event loop free for other requests
+    and downloads. Downloaded files are removed afterwards.
+    """
+    local_path, cache_key = await get_local_file(file_path)
+    try:
+        content = cache_get(cache_key)
+        if content is None:
+            content = await run_conversion(local_path)
+            cache_put(cache_key, content)
+        return content
+    finally:
+        # Only delete files this call downloaded. A local path that happens to
+        # point into the download directory (e.g. another request's file) is
+        # left alone; the prefix check is an extra safeguard.
+        if is_remote(file_path) and is_temp_file(local_path):
+            os.unlink(local_path)
+
+async def run_conversion(local_path: str) -> str:
+    """
+    Convert local_path in the process pool. If a worker died (for example
+    killed for running out of memory), the pool is unusable from then on, so
+    it is replaced and the conversion retried once.
+    """
+    global _POOL
+    loop = asyncio.get_running_loop()
+    pool = _POOL
+    try:
+        return await loop.run_in_executor(pool, _convert_path, local_path)
+    except BrokenProcessPool:
+        # Concurrent callers may all see the broken pool; only replace it once
+        if _POOL is pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+            _POOL = _new_pool()
+        return await loop.run_in_executor(_POOL, _convert_path, local_path)
+
+def cache_get(key: tuple) -> str | None:
+    """Return cached markdown for key, marking it as recently used."""
+    content = _cache.get(key)
+    if content is not None:
+        _cache.move_to_end(key)
+    return content
+
+def cache_put(key: tuple, content: str) -> None:
+    """Store markdown for key, evicting the oldest entries beyond CACHE_SIZE."""
+    if CACHE_SIZE <= 0:
+        return
+    _cache[key] = content
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+def _convert_path(local_path: str) -> str:
+    """
+    Convert a local file to markdown inside a pool worker. Each worker imports
+    this module once, so the module-level MarkItDown instance is reused.
+    """
+    try:
+        return md.convert(local_path).text_content or ""
+    except Exception as e:
+        # MarkItDown errors can carry traceback objects, which cannot be
+        # pickled back to the server process; send just the message
+        raise RuntimeError(str(e)) from None
+
+def check_download_headers(file_path: str, headers) -> None:
+    """
+    Reject a download whose Content-Type is not a supported document type or
+    whose Content-Length exceeds MAX_DOWNLOAD_MB. Missing or malformed headers
+    are allowed; get_local_file also caps the bytes it actually downloads.
+    """
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type and content_type not in ALLOWED_CONTENT_TYPES:
+        raise ValueError(f"Unsupported content type '{content_type}' for {file_path}")
+    content_length = headers.get("content-length", "").strip()
+    if content_length.isdigit() and int(content_length) > MAX_DOWNLOAD_MB * 1024 * 1024:
+        raise ValueError(f"File at {file_path} is larger than {MAX_DOWNLOAD_MB} MB")
+
+_client: httpx.AsyncClient | None = None
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared pooled HTTP client used for downloads, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            follow_redirects=True,
+            timeout=httpx.Timeout(30.0, connect=10.0),
+        )
+    return _client
+
+async def close_client() -> None:
+    """Close the shared HTTP client on shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def get_local_file(file_path: str) -> tuple[str, tuple]:
     """
     If file_path is a public URI, download the file to a temporary location
     and return the local file path. Otherwise, expand the user's path.
+    Also returns a cache key identifying the document's current content.
     """
-    if file_path.startswith("http://") or file_path.startswith("https://"):
+    if is_remote(file_path):
+        # Probe with HEAD first so unsupported or oversized files fail
+        # without transferring the body. A failed or unsupported HEAD (e.g. a
+        # presigned URL signed only for GET) falls through to the GET, which
+        # checks the headers again.
+        client = get_client()
+        try:
+            probe = await client.head(file_path, timeout=10)
+        except httpx.HTTPError:
+            probe = None
+        if probe is not None and probe.is_success:
+            check_download_headers(file_path, probe.headers)
         print(f"Downloading file from {file_path}...")
-        response = requests.get(file_path)
-        response.raise_for_status()
         # Try to preserve file extension, default to .tmp if none
         file_without_query_param = file_path.split("?")[0]
         _, ext = os.path.splitext(file_without_query_param)
-        ext = ext if ext else ".tmp"
-        temp = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-        temp.write(response.content)
-        temp.close()
-        print(f"Saved temporary file at {temp.name}...")
-        return temp.name
-    return os.path.expanduser(file_path)
+        # Stream the body straight to disk in 1 MiB chunks instead of
+        # holding the whole document in memory
+        async with client.stream("GET", file_path) as response:
+            response.raise_for_status()
+            check_download_headers(file_path, response.headers)
+            if not ext:
+                # Fall back to the Content-Type so MarkItDown can detect the format
+                content_type = response.headers.get("content-type", "").split(";")[0].strip()
+                ext = mimetypes.guess_extension(content_type) or ".tmp"
+            dest = os.path.join(get_tmpdir(), f"{uuid.uuid4().hex}{ext}")
+            digest = hashlib.sha256()
+            temp = open(dest, "wb")
+            try:
+                with temp:
+                    size = 0
+                    async for chunk in response.aiter_bytes(1024 * 1024):
+                        # Content-Length may be missing or wrong, so enforce
+                        # the limit on the bytes actually received
+                        size += len(chunk)
+                        if size > MAX_DOWNLOAD_MB * 1024 * 1024:
+                            raise ValueError(f"File at {file_path} is larger than {MAX_DOWNLOAD_MB} MB")
+                        digest.update(chunk)
+                        temp.write(chunk)
+            except BaseException:
+                # Do not leave partial downloads behind
+                os.unlink(dest)
+                raise
+        print(f"Saved temporary file at {dest}...")
+        return dest, ("sha256", digest.hexdigest())
+    local_path = os.path.abspath(os.path.expanduser(file_path))
+    stat = os.stat(local_path)
+    return local_path, ("path", local_path, stat.st_mtime_ns, stat.st_size)
 
 
 # server.py
+async def run_server() -> None:
+    """Run the server and release the shared HTTP client on exit."""
+    try:
+        await mcp.run_streamable_http_async()
+    finally:
+        await close_client()
+
 def main():
-    mcp.run(transport="streamable-http")
+    # Start the conversion workers before the first request arrives
+    _POOL.submit(os.getpid)
+    asyncio.run(run_server())
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,21 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends
 from mcp.server.sse import SseServerTransport
 from starlette.routing import Mount
-from weather import mcp
+from weather import mcp, close_client
 from api_key_auth import ensure_valid_api_key
 import uvicorn
 
 
-app = FastAPI(docs_url=None, redoc_url=None, dependencies=[Depends(ensure_valid_api_key)])
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The HTTP client in weather.py is shared by all SSE sessions,
+    # so it is closed with the app rather than per MCP session.
+    yield
+    await close_client()
+
+
+app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan, dependencies=[Depends(ensure_valid_api_key)])
 
 sse = SseServerTransport("/messages/")
 app.router.routes.append(Mount("/messages", app=sse.handle_post_message))
@@ -1,66 +1,227 @@
+import asyncio
+import io
+import logging
+import re
+import time
+from types import MappingProxyType
 from typing import Any
 import httpx
+import orjson
 from mcp.server.fastmcp import FastMCP
+from tenacity import retry, retry_if_exception, stop_after_attempt, stop_before_delay, wait_exponential_jitter
 
 # Initialize FastMCP server
 mcp = FastMCP("weather")
 
+logger = logging.getLogger(__name__)
+
 # Constants
 NWS_API_BASE = "https://api.weather.gov"
 AVIATION_WEATHER_API = "https://aviationweather.gov/api/data"
 GEOCODING_API = "https://nominatim.openstreetmap.org"
 USER_AGENT = "weather-app/1.0"
+# Per-request headers; User-Agent is set once on the shared client
+NWS_HEADERS = MappingProxyType({"Accept": "application/geo+json"})
+
+# Response cache TTLs in seconds. NWS responses that carry a
+# Cache-Control max-age use that instead.
+POINTS_CACHE_TTL = 30 * 24 * 60 * 60  # NWS grid mappings rarely change
+ALERTS_CACHE_TTL = 60
+GEOCODING_CACHE_TTL = 30 * 24 * 60 * 60
+RESPONSE_CACHE_SIZE = 1024
+
+# Retry policy for transient upstream failures
+# Retries stop before a wait would pass RETRY_DEADLINE, so one request takes
+# at most RETRY_DEADLINE plus a single REQUEST_TIMEOUT (about 30s) overall.
+RETRY_ATTEMPTS = 3
+RETRY_AFTER_MAX = 10.0  # Cap on a server-requested Retry-After delay, in seconds
+RETRY_DEADLINE = 20.0
+REQUEST_TIMEOUT = 10.0  # Per-attempt timeout, in seconds
+
+# Input validation patterns
+ICAO_RE = re.compile(r"[A-Z]{4}")
+STATE_RE = re.compile(r"[A-Z]{2}")
+
+_client: httpx.AsyncClient | None = None
+
+async def get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it on first use.
+
+    A single pooled client keeps connections to the upstream APIs alive
+    between tool calls instead of paying a new TCP/TLS handshake per request.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=100, max_connections=1000),
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=5.0),
+            headers={"User-Agent": USER_AGENT},
+        )
+    return _client
+
+async def close_client() -> None:
+    """Close the shared HTTP client on shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def is_transient(exc: BaseException) -> bool:
+    """Return True for errors worth retrying: network failures, 429 and 5xx responses."""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+_backoff = wait_exponential_jitter(initial=0.2, max=2.0)
+
+def wait_retry_after(retry_state) -> float:
+    """Wait for the server's Retry-After delay if it sent one, else back off with jitter."""
+    exc = retry_state.outcome.exception()
+    if isinstance(exc, httpx.HTTPStatusError):
+        retry_after = exc.response.headers.get("retry-after", "").strip()
+        if retry_after.isdigit():
+            return min(float(retry_after), RETRY_AFTER_MAX)
+    return _backoff(retry_state)
+
+@retry(
+    stop=stop_after_attempt(RETRY_ATTEMPTS) | stop_before_delay(RETRY_DEADLINE),
+    wait=wait_retry_after,
+    retry=retry_if_exception(is_transient),
+    reraise=True,
+)
+async def get_with_retry(url: str, headers: Any = None, params: dict[str, Any] | None = None) -> httpx.Response:
+    """GET url with the shared client, retrying transient failures.
+
+    Raises the last error once retries are exhausted or for permanent failures.
+    """
+    client = await get_client()
+    response = await client.get(url, headers=headers, params=params)
+    response.raise_for_status()
+    return response
+
+_response_cache: dict[str, tuple[float, Any]] = {}
+
+def cache_get(key: str) -> Any | None:
+    """Return a cached response body, or None if missing or expired."""
+    cached = _response_cache.get(key)
+    if cached is None:
+        return None
+    if cached[0] <= time.monotonic():
+        del _response_cache[key]
+        return None
+    return cached[1]
+
+def cache_set(key: str, value: Any, ttl: float) -> None:
+    """Cache a response body for ttl seconds, dropping the oldest entry when full."""
+    if ttl <= 0:
+        return
+    _response_cache.pop(key, None)
+    if len(_response_cache) >= RESPONSE_CACHE_SIZE:
+        del _response_cache[next(iter(_response_cache))]
+    _response_cache[key] = (time.monotonic() + ttl, value)
+
+def parse_max_age(response: httpx.Response) -> int | None:
+    """Return the max-age from a response's Cache-Control header, if any."""
+    for directive in response.headers.get("cache-control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age" and value.isdigit():
+            return int(value)
+    return None
+
+_inflight: dict[str, asyncio.Task] = {}
+
+async def make_nws_request(url: str, ttl: float = 0) -> dict[str, Any] | None:
+    """Make a request to the NWS API with proper error handling.
+
+    Successful responses are cached for ttl seconds, or for the response's
+    Cache-Control max-age when NWS provides one. Concurrent calls for the
+    same URL share a single in-flight request.
+    """
+    cached = cache_get(url)
+    if cached is not None:
+        return cached
 
-async def make_nws_request(url: str) -> dict[str, Any] | None:
-    """Make a request to the NWS API with proper error handling."""
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/geo+json"
-    }
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception:
-            return None
+    task = _inflight.get(url)
+    if task is None:
+        task = asyncio.create_task(fetch_nws(url, ttl))
+        _inflight[url] = task
+        task.add_done_callback(lambda _: _inflight.pop(url, None))
+    # Shield the shared fetch so one cancelled caller does not cancel it for the rest
+    return await asyncio.shield(task)
+
+async def fetch_nws(url: str, ttl: float) -> dict[str, Any] | None:
+    """Fetch an NWS URL and cache the decoded response."""
+    try:
+        response = await get_with_retry(url, headers=NWS_HEADERS)
+        data = orjson.loads(response.content)
+    except Exception as e:
+        logger.warning("NWS request to %s failed: %s", url, e)
+        return None
+
+    max_age = parse_max_age(response)
+    cache_set(url, data, ttl if max_age is None else max_age)
+    return data
 
 async def make_aviation_request(url: str) -> str | None:
     """Make a request to the Aviation Weather API with proper error handling."""
-    headers = {
-        "User-Agent": USER_AGENT
-    }
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.text
-        except Exception:
-            return None
-
-async def make_geocoding_request(url: str) -> dict[str, Any] | None:
-    """Make a request to the geocoding API with proper error handling."""
-    headers = {
-        "User-Agent": USER_AGENT
-    }
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except Exception:
-            return None
-
-def format_alert(feature: dict) -> str:
-    """Format an alert feature into a readable string."""
+    try:
+        response = await get_with_retry(url)
+        return response.text
+    except Exception as e:
+        logger.warning("Aviation Weather request to %s failed: %s", url, e)
+        return None
+
+async def make_geocoding_request(url: str, params: dict[str, Any] | None = None) -> dict[str, Any] | None:
+    """Make a request to the geocoding API with proper error handling.
+
+    Successful responses are cached for GEOCODING_CACHE_TTL seconds.
+    """
+    key = str(httpx.URL(url, params=params))
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        response = await get_with_retry(url, params=params)
+        data = orjson.loads(response.content)
+    except Exception as e:
+        logger.warning("Geocoding request to %s failed: %s", url, e)
+        return None
+
+    cache_set(key, data, GEOCODING_CACHE_TTL)
+    return data
+
+async def get_forecast_url(latitude: float, longitude: float) -> str | None:
+    """Resolve the NWS forecast URL for a coordinate pair.
+
+    The /points lookup only maps coordinates onto the NWS grid, so it is
+    cached for POINTS_CACHE_TTL seconds to skip the first hop of
+    get_forecast on repeated lookups.
+    """
+    points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
+    points_data = await make_nws_request(points_url, ttl=POINTS_CACHE_TTL)
+    if not points_data:
+        return None
+    return points_data["properties"]["forecast"]
+
+def write_alert(buf: io.StringIO, feature: dict) -> None:
+    """Write an alert feature into buf as a readable block."""
     props = feature["properties"]
-    return f"""
-        Event: {props.get('event', 'Unknown')}
-        Area: {props.get('areaDesc', 'Unknown')}
-        Severity: {props.get('severity', 'Unknown')}
-        Description: {props.get('description', 'No description available')}
-        Instructions: {props.get('instruction', 'No specific instructions provided')}
-        """
+    buf.write("\n        Event: ")
+    buf.write(str(props.get('event', 'Unknown')))
+    buf.write("\n        Area: ")
+    buf.write(str(props.get('areaDesc', 'Unknown')))
+    buf.write("\n        Severity: ")
+    buf.write(str(props.get('severity', 'Unknown')))
+    buf.write("\n        Description: ")
+    buf.write(str(props.get('description', 'No description available')))
+    buf.write("\n        Instructions: ")
+    buf.write(str(props.get('instruction', 'No specific instructions provided')))
+    buf.write("\n        ")
 
 @mcp.tool()
 async def get_alerts(state: str) -> str:
@@ -69,8 +230,12 @@ async def get_alerts(state: str) -> str:
     Args:
         state: Two-letter US state code (e.g. CA, NY)
     """
+    state = state.upper().strip()
+    if not STATE_RE.fullmatch(state):
+        return "Invalid state code. Please provide a two-letter US state code (e.g., CA, NY)."
+
     url = f"{NWS_API_BASE}/alerts/active/area/{state}"
-    data = await make_nws_request(url)
+    data = await make_nws_request(url, ttl=ALERTS_CACHE_TTL)
 
     if not data or "features" not in data:
         return "Unable to fetch alerts or no alerts found."
@@ -78,8 +243,13 @@ async def get_alerts(state: str) -> str:
     if not data["features"]:
         return "No active alerts for this state."
 
-    alerts = [format_alert(feature) for feature in data["features"]]
-    return "\n---\n".join(alerts)
+    buf = io.StringIO()
+    sep = ""
+    for feature in data["features"]:
+        buf.write(sep)
+        write_alert(buf, feature)
+        sep = "\n---\n"
+    return buf.getvalue()
 
 @mcp.tool()
 async def get_forecast(latitude: float, longitude: float) -> str:
@@ -90,14 +260,11 @@ async def get_forecast(latitude: float, longitude: float) -> str:
         longitude: Longitude of the location
     """
     # First get the forecast grid endpoint
-    points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
-    points_data = await make_nws_request(points_url)
+    forecast_url = await get_forecast_url(latitude, longitude)
 
-    if not points_data:
+    if not forecast_url:
         return "Unable to fetch forecast data for this location."
 
-    # Get the forecast URL from the points response
-    forecast_url = points_data["properties"]["forecast"]
     forecast_data = await make_nws_request(forecast_url)
 
     if not forecast_data:
@@ -105,17 +272,18 @@ async def get_forecast(latitude: float, longitude: float) -> str:
 
     # Format the periods into a readable forecast
     periods = forecast_data["properties"]["periods"]
-    forecasts = []
+    buf = io.StringIO()
+    sep = ""
     for period in periods[:5]:  # Only show next 5 periods
-        forecast = f"""
-            {period['name']}:
-            Temperature: {period['temperature']}°{period['temperatureUnit']}
-            Wind: {period['windSpeed']} {period['windDirection']}
-            Forecast: {period['detailedForecast']}
-            """
-        forecasts.append(forecast)
+        buf.write(sep)
+        buf.write(f"\n            {period['name']}:")
+        buf.write(f"\n            Temperature: {period['temperature']}°{period['temperatureUnit']}")
+        buf.write(f"\n            Wind: {period['windSpeed']} {period['windDirection']}")
+        buf.write(f"\n            Forecast: {period['detailedForecast']}")
+        buf.write("\n            ")
+        sep = "\n---\n"
 
-    return "\n---\n".join(forecasts)
+    return buf.getvalue()
 
 @mcp.tool()
 async def geocode_location(location: str) -> str:
@@ -127,12 +295,9 @@ async def geocode_location(location: str) -> str:
     if not location or not location.strip():
         return "Please provide a valid location name."
     
-    # URL encode the location and make the request
-    import urllib.parse
-    encoded_location = urllib.parse.quote(location.strip())
-    url = f"{GEOCODING_API}/search?q={encoded_location}&format=json&limit=1"
-    
-    data = await make_geocoding_request(url)
+    # httpx takes care of encoding the query string
+    params = {"q": location.strip(), "format": "json", "limit": 1}
+    data = await make_geocoding_request(f"{GEOCODING_API}/search", params)
     
     if not data or len(data) == 0:
         return f"Unable to find coordinates for '{location}'. Please try a more specific location name."
@@ -152,14 +317,23 @@ async def get_aviation_weather(icao_code: str) -> str:
     """
     # Validate ICAO code format
     icao_code = icao_code.upper().strip()
-    if len(icao_code) != 4 or not icao_code.isalpha():
+    if not ICAO_RE.fullmatch(icao_code):
         return "Invalid ICAO code. Please provide a 4-letter airport code (e.g., KORD, EGLL, KJFK)."
     
     result_parts = []
     
-    # Get METAR data
+    # Fetch METAR and TAF data concurrently
     metar_url = f"{AVIATION_WEATHER_API}/metar?ids={icao_code}&format=raw"
-    metar_data = await make_aviation_request(metar_url)
+    taf_url = f"{AVIATION_WEATHER_API}/taf?ids={icao_code}&format=raw"
+    metar_data, taf_data = await asyncio.gather(
+        make_aviation_request(metar_url),
+        make_aviation_request(taf_url),
+        return_exceptions=True,
+    )
+    if isinstance(metar_data, BaseException):
+        metar_data = None
+    if isinstance(taf_data, BaseException):
+        taf_data = None
     
     if metar_data and metar_data.strip():
         result_parts.append(f"METAR for {icao_code}:")
@@ -167,10 +341,6 @@ async def get_aviation_weather(icao_code: str) -> str:
     else:
         result_parts.append(f"METAR for {icao_code}: No current METAR data available")
     
-    # Get TAF data
-    taf_url = f"{AVIATION_WEATHER_API}/taf?ids={icao_code}&format=raw"
-    taf_data = await make_aviation_request(taf_url)
-    
     if taf_data and taf_data.strip():
         result_parts.append(f"\nTAF for {icao_code}:")
         result_parts.append(taf_data.strip())
@@ -183,6 +353,14 @@ async def get_aviation_weather(icao_code: str) -> str:
     return "\n".join(result_parts)
 
 
+async def run_stdio() -> None:
+    """Run the server over stdio and release the shared HTTP client on exit."""
+    try:
+        await mcp.run_stdio_async()
+    finally:
+        await close_client()
+
+
 if __name__ == "__main__":
     # Initialize and run the server
-    mcp.run(transport='stdio')
+    asyncio.run(run_stdio())